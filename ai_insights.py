@@ -5,12 +5,70 @@ Copyright (c) 2025 Mattias Nyqvist
 Licensed under the MIT License
 """
 
-import anthropic
+import io
 import pandas as pd
-from typing import List, Dict, Optional
+import re
+import streamlit as st
+import threading
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 
+from anthropic_client import PROMPT_CACHING_BETA, get_anthropic_client
 
-def generate_spending_insights(df: pd.DataFrame, budget_df: pd.DataFrame, api_key: str, period_months: int = 1) -> Optional[Dict]:
+if TYPE_CHECKING:
+    import anthropic
+
+MODEL = "claude-sonnet-4-20250514"
+
+# Bump when the insights prompt template changes so cached responses are invalidated
+PROMPT_VERSION = "v2"
+
+# Below this many transactions no AI request is made
+MIN_TRANSACTIONS_FOR_INSIGHTS = 5
+
+# Extra attempts after a rate limit error, and the longest retry-after wait honored (seconds)
+RATE_LIMIT_RETRIES = 2
+MAX_RETRY_AFTER = 30.0
+
+# Seconds a cached Claude response stays valid
+RESPONSE_CACHE_TTL = 3600
+
+# Most cached responses kept; the oldest are dropped beyond this
+RESPONSE_CACHE_MAX_ENTRIES = 256
+
+# (user_content, model, prompt_version) -> (created_at, response_text), shared by all sessions
+_response_cache: Dict[tuple, Tuple[float, str]] = {}
+_response_cache_lock = threading.Lock()
+
+# Static instructions and output format, sent as a cacheable system prompt
+SCHEMA_PROMPT = """You are a financial advisor analyzing a person's spending patterns. Based on the financial summary provided, give personalized insights and actionable recommendations.
+
+Provide:
+1. KEY INSIGHTS: 3-4 observations (what stands out, concerning trends, positive habits)
+2. RECOMMENDATIONS: 4-6 specific, actionable suggestions, prioritized by impact (HIGH/MEDIUM/LOW), with concrete numbers and timeframes
+
+Format your response exactly as:
+
+INSIGHTS:
+- [Insight]
+
+RECOMMENDATIONS:
+Priority: [HIGH/MEDIUM/LOW]
+Category: [Category]
+Action: [Specific action with numbers]
+Impact: [Expected savings or benefit]
+
+Keep insights practical and encouraging. Use Swedish Krona (kr) in all amounts."""
+
+# Patterns for parsing the structured response
+_INSIGHTS_HEADER_RE = re.compile(r'INSIGHTS:', re.IGNORECASE)
+_RECOMMENDATIONS_HEADER_RE = re.compile(r'RECOMMENDATIONS:', re.IGNORECASE)
+_INSIGHT_RE = re.compile(r'^[ \t]*[-•]+[ \t]*(.*?)[ \t]*$', re.MULTILINE)
+_REC_FIELD_RE = re.compile(r'^[ \t]*(Priority|Category|Action|Impact):[ \t]*(.*?)[ \t]*$', re.MULTILINE | re.IGNORECASE)
+
+
+def generate_spending_insights(df: pd.DataFrame, budget_df: pd.DataFrame, api_key: str, period_months: int = 1, placeholder=None) -> Optional[Dict]:
     """
     Generate AI-powered insights and recommendations based on spending patterns.
     
@@ -19,6 +77,7 @@ def generate_spending_insights(df: pd.DataFrame, budget_df: pd.DataFrame, api_ke
         budget_df: DataFrame with budget comparison
         api_key: Anthropic API key
         period_months: Number of months in data
+        placeholder: Optional Streamlit placeholder (st.empty()) for streaming the response
         
     Returns:
         Dictionary with insights and recommendations
@@ -26,60 +85,18 @@ def generate_spending_insights(df: pd.DataFrame, budget_df: pd.DataFrame, api_ke
     if not api_key:
         return None
     
-    client = anthropic.Anthropic(api_key=api_key)
+    # Skip the API call when there is nothing meaningful to analyze
+    no_data = _insufficient_data_insights(df)
+    if no_data:
+        return no_data
+    
+    client = get_anthropic_client(api_key)
     
     # Prepare financial summary
     summary = create_financial_summary(df, budget_df, period_months)
     
-    # Create prompt for Claude
-    prompt = f"""You are a financial advisor analyzing a person's spending patterns. Based on the data below, provide personalized insights and actionable recommendations.
-
-FINANCIAL SUMMARY:
-{summary}
-
-Please provide:
-
-1. KEY INSIGHTS (3-4 observations about spending patterns)
-   - What stands out in their spending?
-   - Any concerning trends?
-   - Positive habits to acknowledge?
-
-2. RECOMMENDATIONS (4-6 specific, actionable suggestions)
-   - Prioritize by impact (HIGH/MEDIUM/LOW)
-   - Be specific with numbers and timeframes
-   - Focus on realistic, achievable changes
-
-Format your response as:
-
-INSIGHTS:
-- [Insight 1]
-- [Insight 2]
-- [Insight 3]
-
-RECOMMENDATIONS:
-Priority: HIGH
-Category: [Category]
-Action: [Specific action with numbers]
-Impact: [Expected savings or benefit]
-
-Priority: MEDIUM
-Category: [Category]
-Action: [Specific action]
-Impact: [Expected benefit]
-
-[Continue with more recommendations...]
-
-Keep insights practical and encouraging. Use Swedish Krona (kr) in all amounts."""
-
     try:
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=2048,
-            temperature=0.7,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        response_text = response.content[0].text.strip()
+        response_text = _get_insights_text(f"FINANCIAL SUMMARY:\n{summary}", client, placeholder)
         
         # Parse response
         parsed = parse_insights_response(response_text)
@@ -91,12 +108,114 @@ Keep insights practical and encouraging. Use Swedish Krona (kr) in all amounts."
         return None
 
 
+def _insufficient_data_insights(df: pd.DataFrame) -> Optional[Dict]:
+    """
+    Return a placeholder insights result when df is too small or has no
+    income and no expenses, otherwise None.
+    """
+    if len(df) < MIN_TRANSACTIONS_FOR_INSIGHTS:
+        return {
+            'insights': [f"Not enough transactions in the selected period (at least {MIN_TRANSACTIONS_FOR_INSIGHTS} needed)."],
+            'recommendations': []
+        }
+    
+    amounts = df['amount'].to_numpy()
+    if not (amounts != 0).any():
+        return {'insights': ["No transactions in the selected period."], 'recommendations': []}
+    
+    return None
+
+
+def _get_insights_text(user_content: str, client: 'anthropic.Anthropic', placeholder=None) -> str:
+    """
+    Return Claude's raw response text for the given user message.
+    Responses are cached on (user_content, MODEL, PROMPT_VERSION) for
+    RESPONSE_CACHE_TTL seconds so unchanged data does not trigger a new API call.
+    """
+    key = (user_content, MODEL, PROMPT_VERSION)
+    now = time.monotonic()
+    
+    with _response_cache_lock:
+        cached = _response_cache.get(key)
+    if cached and now - cached[0] < RESPONSE_CACHE_TTL:
+        return cached[1]
+    
+    # Imported on first use to keep app startup fast
+    import anthropic
+    
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            response_text = _stream_insights(user_content, client, placeholder)
+            break
+        except anthropic.RateLimitError as e:
+            # Still rate limited after the SDK's own retries; wait as instructed by the API
+            if attempt == RATE_LIMIT_RETRIES:
+                raise
+            time.sleep(_retry_after_seconds(e))
+    
+    # Drop expired entries before storing the new one, then the oldest beyond the size cap
+    now = time.monotonic()
+    with _response_cache_lock:
+        for expired_key in [k for k, (created, _) in _response_cache.items() if now - created >= RESPONSE_CACHE_TTL]:
+            del _response_cache[expired_key]
+        _response_cache.pop(key, None)
+        _response_cache[key] = (now, response_text)
+        while len(_response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+            del _response_cache[next(iter(_response_cache))]
+    
+    return response_text
+
+
+def _retry_after_seconds(error: Exception) -> float:
+    """Read the retry-after header from a rate limit error, defaulting to 2 seconds."""
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        return min(float(retry_after), MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return 2.0
+
+
+def _stream_insights(user_content: str, client: 'anthropic.Anthropic', placeholder=None) -> str:
+    """
+    Stream Claude's response, rendering partial text into the optional
+    Streamlit placeholder as tokens arrive.
+    """
+    with client.messages.stream(
+        model=MODEL,
+        max_tokens=800,
+        temperature=0.5,
+        system=[{"type": "text", "text": SCHEMA_PROMPT, "cache_control": {"type": "ephemeral"}}],
+        messages=[{"role": "user", "content": user_content}],
+        extra_headers={"anthropic-beta": PROMPT_CACHING_BETA}
+    ) as stream:
+        if placeholder is not None:
+            partial = ""
+            for text in stream.text_stream:
+                partial += text
+                placeholder.markdown(partial)
+        
+        final_message = stream.get_final_message()
+    
+    if placeholder is not None:
+        placeholder.empty()
+    
+    return final_message.content[0].text.strip()
+
+
+def _frame_digest(frame: pd.DataFrame) -> tuple:
+    """Cheap content digest used as the cache key for DataFrame arguments."""
+    return frame.shape, tuple(frame.columns), int(pd.util.hash_pandas_object(frame, index=False).sum())
+
+
+@st.cache_data(ttl=300, show_spinner=False, hash_funcs={pd.DataFrame: _frame_digest})
 def create_financial_summary(df: pd.DataFrame, budget_df: pd.DataFrame, period_months: int) -> str:
     """Create concise financial summary for AI analysis."""
     
     # Calculate metrics
-    total_income = df[df['amount'] > 0]['amount'].sum()
-    total_expenses = df[df['amount'] < 0]['amount'].abs().sum()
+    amounts = df['amount'].to_numpy()
+    total_income = amounts[amounts > 0].sum()
+    total_expenses = -amounts[amounts < 0].sum()
     net_savings = total_income - total_expenses
     savings_rate = (net_savings / total_income * 100) if total_income > 0 else 0
     
@@ -105,15 +224,27 @@ def create_financial_summary(df: pd.DataFrame, budget_df: pd.DataFrame, period_m
     monthly_savings = net_savings / period_months
     
     # Category breakdown
-    expense_df = df[df['type'] == 'Expense'].copy()
-    category_spending = expense_df.groupby('category')['abs_amount'].sum().sort_values(ascending=False)
+    expense_df = df.loc[(df['type'] == 'Expense').to_numpy()]
+    category_spending = (
+        expense_df
+        .groupby('category', observed=True, sort=False)['abs_amount']
+        .sum()
+        .sort_values(ascending=False)
+    )
     monthly_category = category_spending / period_months
     
     # Budget comparison
     total_budget = budget_df['Budget'].sum()
-    over_budget_categories = budget_df[budget_df['Spent'] / period_months > budget_df['Budget']]
+    budget_monthly = budget_df.assign(monthly_spent=budget_df['Spent'] / period_months)
+    over_budget_categories = budget_monthly.loc[
+        budget_monthly['monthly_spent'] > budget_monthly['Budget'], ['Category', 'monthly_spent', 'Budget']
+    ]
+    over_budget_categories = over_budget_categories.assign(
+        over_by=over_budget_categories['monthly_spent'] - over_budget_categories['Budget']
+    )
     
-    summary = f"""
+    buf = io.StringIO()
+    buf.write(f"""
 PERIOD: {period_months} months of data
 
 OVERALL METRICS:
@@ -123,76 +254,57 @@ OVERALL METRICS:
 - Savings Rate: {savings_rate:.1f}%
 
 MONTHLY SPENDING BY CATEGORY:
-"""
+""")
     
-    for category, amount in monthly_category.items():
-        budget_amount = budget_df[budget_df['Category'] == category]['Budget'].values
-        if len(budget_amount) > 0:
-            budget = budget_amount[0]
-            pct = (amount / budget * 100) if budget > 0 else 0
-            summary += f"- {category}: {amount:,.0f} kr (Budget: {budget:,.0f} kr, {pct:.0f}%)\n"
-        else:
-            summary += f"- {category}: {amount:,.0f} kr\n"
+    # Join monthly spending with budgets (categories without a budget get NaN)
+    category_rows = monthly_category.rename('amount').to_frame().join(
+        budget_df.drop_duplicates('Category').set_index('Category')['Budget']
+    )
+    buf.writelines(
+        f"- {category}: {amount:,.0f} kr\n" if pd.isna(budget)
+        else f"- {category}: {amount:,.0f} kr (Budget: {budget:,.0f} kr, {(amount / budget * 100) if budget > 0 else 0:.0f}%)\n"
+        for category, amount, budget in category_rows.itertuples()
+    )
     
     # Budget status
     if len(over_budget_categories) > 0:
-        summary += f"\nOVER BUDGET CATEGORIES ({len(over_budget_categories)}):\n"
-        for _, row in over_budget_categories.iterrows():
-            monthly_spent = row['Spent'] / period_months
-            over_by = monthly_spent - row['Budget']
-            summary += f"- {row['Category']}: {over_by:,.0f} kr over budget monthly\n"
+        buf.write(f"\nOVER BUDGET CATEGORIES ({len(over_budget_categories)}):\n")
+        buf.writelines(
+            f"- {category}: {over_by:,.0f} kr over budget monthly\n"
+            for category, _, _, over_by in over_budget_categories.itertuples(index=False)
+        )
     
     # Spending trends
     if 'month' in df.columns:
-        recent_months = df[df['type'] == 'Expense'].groupby('month')['abs_amount'].sum().tail(3)
+        # Grouping on (year, month) sorts chronologically, so the last three entries are the most recent
+        recent_months = expense_df.groupby(['year', 'month'], observed=True)['abs_amount'].sum().to_numpy()[-3:]
         if len(recent_months) >= 2:
-            trend = ((recent_months.iloc[-1] - recent_months.iloc[0]) / recent_months.iloc[0] * 100)
-            summary += f"\nRECENT TREND: Spending {'increased' if trend > 0 else 'decreased'} by {abs(trend):.1f}% over last 3 months\n"
+            trend = ((recent_months[-1] - recent_months[0]) / recent_months[0] * 100)
+            buf.write(f"\nRECENT TREND: Spending {'increased' if trend > 0 else 'decreased'} by {abs(trend):.1f}% over last 3 months\n")
     
-    return summary
+    return buf.getvalue()
 
 
 def parse_insights_response(response_text: str) -> Dict:
     """Parse AI response into structured format."""
     
-    insights = []
-    recommendations = []
+    # Split into the INSIGHTS and RECOMMENDATIONS sections
+    parts = _RECOMMENDATIONS_HEADER_RE.split(response_text, maxsplit=1)
+    insights_part = _INSIGHTS_HEADER_RE.split(parts[0], maxsplit=1)[-1]
+    rec_part = parts[1] if len(parts) > 1 else ''
+    
+    insights = [insight for insight in _INSIGHT_RE.findall(insights_part) if insight]
     
-    sections = response_text.split('\n')
-    current_section = None
+    recommendations = []
     current_rec = {}
     
-    for line in sections:
-        line = line.strip()
-        
-        if 'INSIGHTS:' in line.upper():
-            current_section = 'insights'
-            continue
-        elif 'RECOMMENDATIONS:' in line.upper():
-            current_section = 'recommendations'
-            continue
-        
-        if current_section == 'insights':
-            if line.startswith('-') or line.startswith('•'):
-                insight = line.lstrip('-•').strip()
-                if insight:
-                    insights.append(insight)
-        
-        elif current_section == 'recommendations':
-            if line.startswith('Priority:'):
-                # Save previous recommendation if exists
-                if current_rec:
-                    recommendations.append(current_rec)
-                    current_rec = {}
-                
-                priority = line.replace('Priority:', '').strip()
-                current_rec['priority'] = priority
-            elif line.startswith('Category:'):
-                current_rec['category'] = line.replace('Category:', '').strip()
-            elif line.startswith('Action:'):
-                current_rec['action'] = line.replace('Action:', '').strip()
-            elif line.startswith('Impact:'):
-                current_rec['impact'] = line.replace('Impact:', '').strip()
+    for field, value in _REC_FIELD_RE.findall(rec_part):
+        field = field.lower()
+        if field == 'priority' and current_rec:
+            # Each Priority line starts a new recommendation
+            recommendations.append(current_rec)
+            current_rec = {}
+        current_rec[field] = value
     
     # Add last recommendation
     if current_rec:
@@ -206,7 +318,6 @@ def parse_insights_response(response_text: str) -> Dict:
 
 def render_insights_ui(insights_data: Dict):
     """Render insights and recommendations in Streamlit."""
-    import streamlit as st
     
     if not insights_data:
         st.error("Failed to generate insights. Please check your API key.")
@@ -215,8 +326,9 @@ def render_insights_ui(insights_data: Dict):
     # Display insights
     st.markdown("### Key Insights")
     
-    for insight in insights_data.get('insights', []):
-        st.markdown(f"- {insight}")
+    insights = insights_data.get('insights', [])
+    if insights:
+        st.markdown("\n".join(f"- {insight}" for insight in insights))
     
     st.markdown("---")
     
@@ -229,34 +341,29 @@ def render_insights_ui(insights_data: Dict):
         st.info("No specific recommendations at this time.")
         return
     
-    # Group by priority
-    high_priority = [r for r in recommendations if r.get('priority', '').upper() == 'HIGH']
-    medium_priority = [r for r in recommendations if r.get('priority', '').upper() == 'MEDIUM']
-    low_priority = [r for r in recommendations if r.get('priority', '').upper() == 'LOW']
+    # Group by priority in a single pass
+    by_priority = defaultdict(list)
+    for rec in recommendations:
+        by_priority[rec.get('priority', '').upper()].append(rec)
+    
+    def render_recommendations(recs: List[Dict]):
+        # One markdown block per priority group instead of several calls per recommendation
+        st.markdown("\n\n".join(
+            f"**{rec.get('category', 'General')}**  \n"
+            f"**Action:** {rec.get('action', 'N/A')}  \n"
+            f"**Impact:** {rec.get('impact', 'N/A')}"
+            for rec in recs
+        ))
     
     # Display high priority first
-    if high_priority:
+    if by_priority['HIGH']:
         st.markdown("#### High Priority")
-        for rec in high_priority:
-            with st.container():
-                st.markdown(f"**{rec.get('category', 'General')}**")
-                st.markdown(f"**Action:** {rec.get('action', 'N/A')}")
-                st.markdown(f"**Impact:** {rec.get('impact', 'N/A')}")
-                st.markdown("")
-    
-    if medium_priority:
+        render_recommendations(by_priority['HIGH'])
+    
+    if by_priority['MEDIUM']:
         st.markdown("#### Medium Priority")
-        for rec in medium_priority:
-            with st.container():
-                st.markdown(f"**{rec.get('category', 'General')}**")
-                st.markdown(f"**Action:** {rec.get('action', 'N/A')}")
-                st.markdown(f"**Impact:** {rec.get('impact', 'N/A')}")
-                st.markdown("")
-    
-    if low_priority:
+        render_recommendations(by_priority['MEDIUM'])
+    
+    if by_priority['LOW']:
         with st.expander("Low Priority Recommendations"):
-            for rec in low_priority:
-                st.markdown(f"**{rec.get('category', 'General')}**")
-                st.markdown(f"**Action:** {rec.get('action', 'N/A')}")
-                st.markdown(f"**Impact:** {rec.get('impact', 'N/A')}")
-                st.markdown("")
\ No newline at end of file
+            render_recommendations(by_priority['LOW'])
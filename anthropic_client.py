@@ -0,0 +1,36 @@
+"""
+Shared Anthropic API client
+
+Copyright (c) 2025 Mattias Nyqvist
+Licensed under the MIT License
+"""
+
+import streamlit as st
+
+# Beta header enabling cache_control on system prompt blocks
+PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+
+
+@st.cache_resource(show_spinner=False)
+def get_anthropic_client(api_key: str):
+    """
+    Return an Anthropic client for the given API key, shared across reruns and sessions.
+    Reusing the client keeps the underlying HTTP connection pool alive,
+    so repeated requests skip the TCP/TLS handshake.
+    
+    Args:
+        api_key: Anthropic API key
+    
+    Returns:
+        anthropic.Anthropic client
+    """
+    # Imported on first use to keep app startup fast
+    import anthropic
+    import httpx
+    
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0),
+        timeout=httpx.Timeout(120.0, connect=10.0)
+    )
+    # The SDK retries connection errors, 408/409/429 and 5xx responses with backoff
+    return anthropic.Anthropic(api_key=api_key, http_client=http_client, max_retries=3)
@@ -7,9 +7,8 @@ Licensed under the MIT License
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
+import io
 import os
 from dotenv import load_dotenv
 
@@ -33,18 +32,38 @@ from categorizer import (
 # Load environment variables
 load_dotenv()
 
+# Bounds for caches holding values derived from user data: st.cache_data is shared by
+# all sessions, so entries expire after CACHE_TTL seconds and at most CACHE_MAX_ENTRIES are kept
+CACHE_TTL = 300
+CACHE_MAX_ENTRIES = 8
+
+# Cached wrappers: reruns triggered by widgets that don't change the data
+# (number format, budget tabs, etc.) reuse the previous results
+cached_summary_stats = st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)(calculate_summary_stats)
+cached_category_summary = st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)(get_category_summary)
+cached_budget_status = st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)(get_budget_status)
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_budget_gauge(budget_df: pd.DataFrame, period_months=1):
+    """Cached budget gauge chart; budget_manager (and plotly with it) is imported on first use."""
+    from budget_manager import create_budget_gauge_chart
+    
+    return create_budget_gauge_chart(budget_df, period_months=period_months)
+
+
 # Helper function for number formatting
-def format_kr(number, decimals=0):
+def format_kr(number, decimals=0, num_format=None):
     """
     Format number based on user preference.
     Swedish: 23 500,50 kr (space separator, comma decimal)
     International: 23,500.50 kr (comma separator, period decimal)
+    Pass num_format to skip the session state lookup.
+    Expects a real number: process_transactions drops rows with missing amounts.
     """
-    if pd.isna(number):
-        return "0"
-    
     # Get user preference (default to Swedish)
-    num_format = st.session_state.get('number_format', 'swedish')
+    if num_format is None:
+        num_format = st.session_state.get('number_format', 'swedish')
     
     if num_format == 'swedish':
         # Swedish format: space separator, comma decimal
@@ -61,6 +80,96 @@ def format_kr(number, decimals=0):
     
     return formatted
 
+
+# Swedish separators: thousands ',' -> ' ', decimal '.' -> ','
+SWEDISH_SEPARATORS = str.maketrans({',': ' ', '.': ','})
+
+
+def format_kr_series(values: pd.Series, decimals=0, num_format=None) -> pd.Series:
+    """
+    Format a whole Series of numbers like format_kr.
+    The number format preference and format spec are resolved once for all values.
+    """
+    if num_format is None:
+        num_format = st.session_state.get('number_format', 'swedish')
+    spec = f",.{decimals}f"
+    
+    if num_format == 'swedish':
+        formatted = [format(value, spec).translate(SWEDISH_SEPARATORS) for value in values.to_numpy()]
+    else:
+        formatted = [format(value, spec) for value in values.to_numpy()]
+    
+    return pd.Series(formatted, index=values.index)
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def to_csv_bytes(data: pd.DataFrame) -> bytes:
+    """Encode DataFrame as UTF-8 CSV bytes for download (cached across reruns)."""
+    buffer = io.BytesIO()
+    data.to_csv(buffer, index=False, encoding='utf-8')
+    return buffer.getvalue()
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def build_category_charts(names: tuple, values: tuple):
+    """Build the category pie and bar charts (cached on the category totals)."""
+    import plotly.express as px
+    
+    names, values = list(names), list(values)
+    
+    fig_pie = px.pie(
+        values=values,
+        names=names,
+        title="Expense Distribution by Category",
+        hole=0.4
+    )
+    fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+    
+    fig_bar = px.bar(
+        x=values,
+        y=names,
+        orientation='h',
+        title="Total Spending by Category",
+        labels={'x': 'Amount (kr)', 'y': 'Category'}
+    )
+    fig_bar.update_layout(showlegend=False, yaxis={'categoryorder':'total ascending'})
+    
+    return fig_pie, fig_bar
+
+
+# Timeline trace order and colors (Plotly's first two defaults, as px.line assigned them)
+TIMELINE_COLORS = {'Expense': '#636EFA', 'Income': '#EF553B'}
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def build_timeline_chart(monthly_data: pd.DataFrame):
+    """Build the income vs expenses timeline (cached on the monthly totals)."""
+    import plotly.graph_objects as go
+    
+    # WebGL traces keep the browser responsive as the number of points grows
+    fig = go.Figure()
+    grouped = dict(tuple(monthly_data.groupby('type', observed=True, sort=False)))
+    for transaction_type, color in TIMELINE_COLORS.items():
+        if transaction_type not in grouped:
+            continue
+        type_data = grouped[transaction_type]
+        fig.add_trace(go.Scattergl(
+            x=type_data['period'],
+            y=type_data['abs_amount'],
+            mode='lines+markers',
+            name=transaction_type,
+            line={'color': color},
+            marker={'color': color}
+        ))
+    
+    fig.update_layout(
+        title='Income vs Expenses Over Time',
+        xaxis_title='Month',
+        yaxis_title='Amount (kr)',
+        legend_title_text='type'
+    )
+    
+    return fig
+
 # Page config
 st.set_page_config(
     page_title="Financial Dashboard",
@@ -76,6 +185,13 @@ if 'df' not in st.session_state:
 if 'categorized' not in st.session_state:
     st.session_state.categorized = False
 
+if 'uploaded_file_id' not in st.session_state:
+    st.session_state.uploaded_file_id = None
+
+# AI category answers for this session only, so one user's answers never categorize another's data
+if 'ai_category_cache' not in st.session_state:
+    st.session_state.ai_category_cache = {}
+
 if 'number_format' not in st.session_state:
     st.session_state.number_format = 'swedish'
 
@@ -102,12 +218,14 @@ if st.sidebar.button("Load Sample Data"):
         else:
             st.session_state.df = df
             st.session_state.categorized = False
+            # Keep the sample data even though a file is still in the uploader
+            st.session_state.uploaded_file_id = uploaded_file.file_id if uploaded_file is not None else None
             st.sidebar.success("Sample data loaded successfully")
     except Exception as e:
         st.sidebar.error(f"Error loading sample data: {str(e)}")
 
-# Process uploaded file
-if uploaded_file is not None:
+# Process uploaded file (once per upload; reruns reuse the processed DataFrame)
+if uploaded_file is not None and uploaded_file.file_id != st.session_state.uploaded_file_id:
     df, error = load_transaction_file(uploaded_file)
     
     if error:
@@ -115,6 +233,7 @@ if uploaded_file is not None:
     else:
         st.session_state.df = df
         st.session_state.categorized = False
+        st.session_state.uploaded_file_id = uploaded_file.file_id
         st.sidebar.success(f"Loaded {len(df)} transactions successfully")
 
 # Main content
@@ -168,7 +287,9 @@ if st.sidebar.button("Categorize Transactions", type="primary"):
             st.sidebar.error("API key not configured. Using rule-based categorization.")
             use_ai = False
         
-        st.session_state.df = categorize_transactions_bulk(df, use_ai=use_ai, api_key=api_key)
+        st.session_state.df = categorize_transactions_bulk(
+            df, use_ai=use_ai, api_key=api_key, category_cache=st.session_state.ai_category_cache
+        )
         st.session_state.categorized = True
         st.sidebar.success("Categorization complete")
         st.rerun()
@@ -202,6 +323,9 @@ transaction_type = st.sidebar.radio(
 
 df = filter_by_type(df, transaction_type)
 
+# Expense rows, shared by the category, budget and AI insights sections
+expense_df = df[(df['type'] == 'Expense').to_numpy()]
+
 # Number formatting preference
 st.sidebar.markdown("---")
 st.sidebar.subheader("Number Format")
@@ -215,6 +339,9 @@ number_format = st.sidebar.radio(
 
 st.session_state.number_format = 'swedish' if number_format.startswith('Swedish') else 'international'
 
+# Snapshot once per rerun and pass to the formatters explicitly
+NUM_FORMAT = st.session_state.number_format
+
 # Footer in sidebar
 st.sidebar.markdown("---")
 st.sidebar.markdown(f"**Version:** {__version__}")
@@ -225,28 +352,28 @@ st.sidebar.caption("MIT License")
 st.markdown("---")
 
 # Summary metrics
-stats = calculate_summary_stats(df)
+stats = cached_summary_stats(df)
 
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
     st.metric(
         "Total Income",
-        f"{format_kr(stats['total_income'])} kr",
+        f"{format_kr(stats['total_income'], num_format=NUM_FORMAT)} kr",
         help="Total income in selected period"
     )
 
 with col2:
     st.metric(
         "Total Expenses",
-        f"{format_kr(stats['total_expenses'])} kr",
+        f"{format_kr(stats['total_expenses'], num_format=NUM_FORMAT)} kr",
         help="Total expenses in selected period"
     )
 
 with col3:
     st.metric(
         "Net Savings",
-        f"{format_kr(stats['net_savings'])} kr",
+        f"{format_kr(stats['net_savings'], num_format=NUM_FORMAT)} kr",
         delta=f"{stats['savings_rate']:.1f}%",
         help="Income minus expenses"
     )
@@ -254,7 +381,7 @@ with col3:
 with col4:
     st.metric(
         "Transactions",
-        f"{format_kr(stats['num_transactions'])}",
+        f"{format_kr(stats['num_transactions'], num_format=NUM_FORMAT)}",
         help="Number of transactions"
     )
 
@@ -264,45 +391,28 @@ st.markdown("---")
 if st.session_state.categorized and 'category' in df.columns:
     st.subheader("Spending by Category")
     
-    # Filter out income for category analysis
-    expense_df = df[df['type'] == 'Expense'].copy()
-    
     if len(expense_df) > 0:
+        category_totals = expense_df.groupby('category', observed=True, sort=False)['abs_amount'].sum().sort_values(ascending=False)
+        fig_pie, fig_bar = build_category_charts(tuple(category_totals.index), tuple(category_totals.values))
+        
         col1, col2 = st.columns(2)
         
         with col1:
             # Pie chart
-            category_totals = expense_df.groupby('category')['abs_amount'].sum().sort_values(ascending=False)
-            
-            fig_pie = px.pie(
-                values=category_totals.values,
-                names=category_totals.index,
-                title="Expense Distribution by Category",
-                hole=0.4
-            )
-            fig_pie.update_traces(textposition='inside', textinfo='percent+label')
-            st.plotly_chart(fig_pie, use_container_width=True)
+            st.plotly_chart(fig_pie, use_container_width=True, key='pie_categories')
         
         with col2:
             # Bar chart
-            fig_bar = px.bar(
-                x=category_totals.values,
-                y=category_totals.index,
-                orientation='h',
-                title="Total Spending by Category",
-                labels={'x': 'Amount (kr)', 'y': 'Category'}
-            )
-            fig_bar.update_layout(showlegend=False, yaxis={'categoryorder':'total ascending'})
-            st.plotly_chart(fig_bar, use_container_width=True)
+            st.plotly_chart(fig_bar, use_container_width=True, key='bar_categories')
         
         # Category summary table
         st.markdown("### Category Summary")
-        category_summary = get_category_summary(expense_df)
+        category_summary = cached_category_summary(expense_df)
         
         # Format the numbers in the table
         display_summary = category_summary.copy()
-        display_summary['Total'] = display_summary['Total'].apply(lambda x: f"{format_kr(x)} kr")
-        display_summary['Average'] = display_summary['Average'].apply(lambda x: f"{format_kr(x)} kr")
+        display_summary['Total'] = format_kr_series(display_summary['Total'], num_format=NUM_FORMAT) + " kr"
+        display_summary['Average'] = format_kr_series(display_summary['Average'], num_format=NUM_FORMAT) + " kr"
         
         st.dataframe(display_summary, use_container_width=True)
     else:
@@ -315,20 +425,12 @@ st.subheader("Spending Over Time")
 
 # Group by month
 if 'month_name' in df.columns:
-    monthly_data = df.groupby(['year', 'month', 'month_name', 'type'])['abs_amount'].sum().reset_index()
+    monthly_data = df.groupby(['year', 'month', 'month_name', 'type'], observed=True)['abs_amount'].sum().reset_index()
     monthly_data['period'] = monthly_data['year'].astype(str) + '-' + monthly_data['month'].astype(str).str.zfill(2)
     
     # Create line chart
-    fig_timeline = px.line(
-        monthly_data,
-        x='period',
-        y='abs_amount',
-        color='type',
-        title='Income vs Expenses Over Time',
-        labels={'abs_amount': 'Amount (kr)', 'period': 'Month'},
-        markers=True
-    )
-    st.plotly_chart(fig_timeline, use_container_width=True)
+    fig_timeline = build_timeline_chart(monthly_data)
+    st.plotly_chart(fig_timeline, use_container_width=True, key='timeline')
 
 st.markdown("---")
 
@@ -339,12 +441,11 @@ st.subheader("Recent Transactions")
 num_to_show = st.selectbox("Number of transactions to display", [10, 25, 50, 100], index=0)
 
 # Show transactions with formatted amounts
-display_df = df.head(num_to_show)[['date', 'description', 'amount', 'type']].copy()
-if 'category' in df.columns:
-    display_df = df.head(num_to_show)[['date', 'description', 'amount', 'category', 'type']].copy()
+display_columns = ['date', 'description', 'amount', 'category', 'type'] if 'category' in df.columns else ['date', 'description', 'amount', 'type']
+display_df = df.iloc[:num_to_show][display_columns].copy()
 
 # Format amounts
-display_df['amount'] = display_df['amount'].apply(lambda x: f"{format_kr(x, decimals=2)} kr")
+display_df['amount'] = format_kr_series(display_df['amount'], decimals=2, num_format=NUM_FORMAT) + " kr"
 
 st.dataframe(display_df, use_container_width=True, hide_index=True)
 
@@ -357,7 +458,7 @@ if not st.session_state.categorized:
     st.info("Categorize transactions first to use budget tracking")
 else:
     # Import budget functions
-    from budget_manager import render_budget_editor, render_budget_progress, create_budget_gauge_chart, DEFAULT_BUDGETS
+    from budget_manager import render_budget_editor, render_budget_progress, DEFAULT_BUDGETS
     
     # Initialize budgets in session state
     if 'budgets' not in st.session_state:
@@ -375,15 +476,15 @@ else:
         st.info(f"Analyzing {date_range_months} months of data: {df['date'].min().strftime('%Y-%m-%d')} to {df['date'].max().strftime('%Y-%m-%d')}")
         
         # Get budget status
-        budget_df = get_budget_status(df[df['type'] == 'Expense'], st.session_state.budgets)
+        budget_df = cached_budget_status(expense_df, st.session_state.budgets)
         
         # Overall metrics
         col1, col2 = st.columns([1, 2])
         
         with col1:
             # Gauge chart with monthly average
-            fig_gauge = create_budget_gauge_chart(budget_df, period_months=date_range_months)
-            st.plotly_chart(fig_gauge, use_container_width=True)
+            fig_gauge = cached_budget_gauge(budget_df, period_months=date_range_months)
+            st.plotly_chart(fig_gauge, use_container_width=True, key='budget_gauge')
         
         with col2:
             # Period totals
@@ -394,10 +495,10 @@ else:
             
             col2a, col2b = st.columns(2)
             with col2a:
-                st.metric("Budget (Period)", f"{format_kr(total_budget_period)} kr")
-                st.metric("Spent (Period)", f"{format_kr(total_spent_period)} kr")
+                st.metric("Budget (Period)", f"{format_kr(total_budget_period, num_format=NUM_FORMAT)} kr")
+                st.metric("Spent (Period)", f"{format_kr(total_spent_period, num_format=NUM_FORMAT)} kr")
             with col2b:
-                st.metric("Remaining", f"{format_kr(total_remaining)} kr")
+                st.metric("Remaining", f"{format_kr(total_remaining, num_format=NUM_FORMAT)} kr")
                 if total_budget_period > 0:
                     st.metric("Usage", f"{(total_spent_period/total_budget_period*100):.1f}%")
             
@@ -409,9 +510,9 @@ else:
             
             col2c, col2d = st.columns(2)
             with col2c:
-                st.metric("Monthly Budget", f"{format_kr(monthly_budget)} kr")
+                st.metric("Monthly Budget", f"{format_kr(monthly_budget, num_format=NUM_FORMAT)} kr")
             with col2d:
-                st.metric("Avg Monthly Spending", f"{format_kr(monthly_spent)} kr")
+                st.metric("Avg Monthly Spending", f"{format_kr(monthly_spent, num_format=NUM_FORMAT)} kr")
         
         # Progress bars per category
         st.markdown("---")
@@ -505,6 +606,9 @@ else:
         # Generate insights button
         col1, col2 = st.columns([1, 4])
         
+        # Streamed response is rendered here while it is being generated
+        stream_placeholder = st.empty()
+        
         with col1:
             if st.button("Generate AI Insights", type="primary", use_container_width=True):
                 with st.spinner("Analyzing your spending patterns with AI..."):
@@ -517,14 +621,15 @@ else:
                         from budget_manager import DEFAULT_BUDGETS
                         st.session_state.budgets = DEFAULT_BUDGETS.copy()
                     
-                    budget_df = get_budget_status(df[df['type'] == 'Expense'], st.session_state.budgets)
+                    budget_df = cached_budget_status(expense_df, st.session_state.budgets)
                     
                     # Generate insights
                     insights = generate_spending_insights(
                         df=df,
                         budget_df=budget_df,
                         api_key=api_key,
-                        period_months=date_range_months
+                        period_months=date_range_months,
+                        placeholder=stream_placeholder
                     )
                     
                     st.session_state.ai_insights = insights
@@ -548,10 +653,9 @@ st.subheader("Export Data")
 col1, col2 = st.columns(2)
 
 with col1:
-    csv = df.to_csv(index=False)
     st.download_button(
         label="Download as CSV",
-        data=csv,
+        data=to_csv_bytes(df),
         file_name=f"transactions_{datetime.now().strftime('%Y%m%d')}.csv",
         mime="text/csv",
         use_container_width=True
@@ -5,6 +5,8 @@ Copyright (c) 2025 Mattias Nyqvist
 Licensed under the MIT License
 """
 
+import numpy as np
+import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 
@@ -60,35 +62,25 @@ def render_budget_editor(current_budgets: dict = None) -> dict:
     st.markdown("### Set Monthly Budgets")
     st.markdown("Define spending limits for each category:")
     
-    budgets = {}
-    
-    # Create two columns for better layout
-    col1, col2 = st.columns(2)
-    
-    categories = list(current_budgets.keys())
-    mid_point = len(categories) // 2
-    
-    with col1:
-        for category in categories[:mid_point]:
-            budgets[category] = st.number_input(
-                category,
-                min_value=0,
-                value=int(current_budgets.get(category, 1000)),
-                step=100,
-                key=f"budget_{category}"
-            )
-    
-    with col2:
-        for category in categories[mid_point:]:
-            budgets[category] = st.number_input(
-                category,
-                min_value=0,
-                value=int(current_budgets.get(category, 1000)),
-                step=100,
-                key=f"budget_{category}"
-            )
-    
-    return budgets
+    # Single editable table instead of one number input per category
+    budget_table = pd.DataFrame({
+        'Category': list(current_budgets.keys()),
+        'Monthly Budget': [int(value) for value in current_budgets.values()]
+    })
+    
+    edited = st.data_editor(
+        budget_table,
+        num_rows='fixed',
+        disabled=['Category'],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            'Monthly Budget': st.column_config.NumberColumn(min_value=0, step=100, format="%d kr")
+        },
+        key='budgets_editor'
+    )
+    
+    return dict(zip(edited['Category'], edited['Monthly Budget'].fillna(0).astype(int)))
 
 
 def render_budget_progress(budget_df, period_months=1):
@@ -102,22 +94,22 @@ def render_budget_progress(budget_df, period_months=1):
     st.markdown("### Budget Overview by Category")
     st.caption(f"Showing monthly averages based on {period_months} months of data")
     
-    for _, row in budget_df.iterrows():
-        category = row['Category']
-        
-        # Calculate monthly averages
-        monthly_budget = row['Budget']
-        monthly_spent = row['Spent'] / period_months
-        monthly_remaining = monthly_budget - monthly_spent
-        percent = (monthly_spent / monthly_budget * 100) if monthly_budget > 0 else 0
-        
-        # Color coding
-        if percent >= 100:
-            color = "#dc2626"  # Red
-        elif percent >= 80:
-            color = "#f59e0b"  # Orange
-        else:
-            color = "#059669"  # Green
+    # Monthly averages for all categories at once
+    categories = budget_df['Category'].to_numpy()
+    monthly_budgets = budget_df['Budget'].to_numpy(dtype=float)
+    monthly_spent_arr = budget_df['Spent'].to_numpy(dtype=float) / period_months
+    monthly_remaining_arr = monthly_budgets - monthly_spent_arr
+    percents = np.divide(
+        monthly_spent_arr * 100, monthly_budgets,
+        out=np.zeros_like(monthly_spent_arr), where=monthly_budgets > 0
+    )
+    
+    for i in range(len(categories)):
+        category = categories[i]
+        monthly_budget = monthly_budgets[i]
+        monthly_spent = monthly_spent_arr[i]
+        monthly_remaining = monthly_remaining_arr[i]
+        percent = percents[i]
         
         # Progress bar with info
         col1, col2 = st.columns([3, 1])
@@ -5,10 +5,12 @@ Copyright (c) 2025 Mattias Nyqvist
 Licensed under the MIT License
 """
 
-import anthropic
+import numpy as np
 import os
 import pandas as pd
-from typing import List, Dict
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
 
 # Default categories
 DEFAULT_CATEGORIES = {
@@ -24,6 +26,37 @@ DEFAULT_CATEGORIES = {
     'Other': []
 }
 
+# One compiled keyword alternation per category (categories without keywords are skipped)
+_CATEGORY_PATTERNS = {
+    category: re.compile('|'.join(re.escape(keyword.lower()) for keyword in keywords))
+    for category, keywords in DEFAULT_CATEGORIES.items()
+    if keywords
+}
+
+# Numbered "<n>. <category>" lines in AI categorization responses
+_CATEGORY_LINE_RE = re.compile(r'^[ \t]*(\d+)[.):][ \t]*(.+?)[ \t]*$', re.MULTILINE)
+
+# Distinct descriptions per AI request, and how many requests may run at once
+AI_BATCH_SIZE = 200
+AI_MAX_CONCURRENCY = 4
+
+# Static instructions and category list, sent as a cacheable system prompt shared by all batches
+_CATEGORY_LIST = "\n".join(f"- {category}" for category in DEFAULT_CATEGORIES)
+CATEGORIZATION_PROMPT = f"""Categorize these financial transactions into appropriate categories.
+
+Available categories:
+{_CATEGORY_LIST}
+
+Return ONLY one line per transaction in the form "<number>. <category>", using the transaction numbers given.
+Example:
+1. Food & Groceries
+2. Transportation"""
+
+# Category names by rank; a lower rank wins when several categories match
+_CATEGORY_NAMES = list(DEFAULT_CATEGORIES.keys())
+_OTHER_RANK = _CATEGORY_NAMES.index('Other')
+_PATTERN_RANKS = [_CATEGORY_NAMES.index(category) for category in _CATEGORY_PATTERNS]
+
 
 def categorize_transaction_simple(description: str) -> str:
     """
@@ -37,15 +70,51 @@ def categorize_transaction_simple(description: str) -> str:
     """
     description_lower = description.lower()
     
-    for category, keywords in DEFAULT_CATEGORIES.items():
-        for keyword in keywords:
-            if keyword.lower() in description_lower:
-                return category
+    for category, pattern in _CATEGORY_PATTERNS.items():
+        if pattern.search(description_lower):
+            return category
     
     return 'Other'
 
 
-def categorize_transactions_bulk(df: pd.DataFrame, use_ai: bool = False, api_key: str = None) -> pd.DataFrame:
+def categorize_descriptions(descriptions: pd.Series) -> pd.Series:
+    """
+    Vectorized rule-based categorization of a Series of descriptions.
+    Same result as applying categorize_transaction_simple to each value.
+    
+    Args:
+        descriptions: Series of transaction descriptions
+        
+    Returns:
+        Categorical Series of category names aligned with descriptions
+    """
+    # Repeat merchants are common, so only categorize each distinct description once
+    codes, unique_descriptions = pd.factorize(descriptions)
+    ranks = _categorize_unique(pd.Series(unique_descriptions))
+    
+    # Missing descriptions (code -1) pick up the trailing 'Other' rank
+    ranks = np.append(ranks, _OTHER_RANK)
+    categories = pd.Categorical.from_codes(ranks[codes], categories=_CATEGORY_NAMES)
+    
+    return pd.Series(categories, index=descriptions.index, name=descriptions.name)
+
+
+def _categorize_unique(descriptions: pd.Series) -> np.ndarray:
+    """Categorize a Series of (distinct) descriptions, returning category ranks in the same order."""
+    descriptions_lower = descriptions.str.lower()
+    
+    # First matching category wins, in DEFAULT_CATEGORIES order. Pattern sources are
+    # passed as strings so Arrow-backed columns can match with Arrow's regex kernel
+    conditions = [
+        descriptions_lower.str.contains(pattern.pattern, na=False).to_numpy(dtype=bool)
+        for pattern in _CATEGORY_PATTERNS.values()
+    ]
+    
+    return np.select(conditions, _PATTERN_RANKS, default=_OTHER_RANK).astype(np.int8)
+
+
+def categorize_transactions_bulk(df: pd.DataFrame, use_ai: bool = False, api_key: str = None,
+                                 category_cache: Optional[Dict[str, str]] = None) -> pd.DataFrame:
     """
     Categorize all transactions in DataFrame.
     
@@ -53,78 +122,128 @@ def categorize_transactions_bulk(df: pd.DataFrame, use_ai: bool = False, api_key
         df: DataFrame with transactions
         use_ai: Whether to use AI categorization
         api_key: Anthropic API key (required if use_ai=True)
+        category_cache: Optional {normalized description: category} dict of earlier AI answers
         
     Returns:
         DataFrame with 'category' column added
     """
     if use_ai and api_key:
-        df['category'] = categorize_with_ai(df, api_key)
+        categories = categorize_with_ai(df, api_key, category_cache)
     else:
-        df['category'] = df['description'].apply(categorize_transaction_simple)
+        categories = categorize_descriptions(df['description'])
+    
+    # Fixed set of categories, stored as small integer codes
+    df['category'] = pd.Categorical(categories, categories=list(DEFAULT_CATEGORIES.keys()))
     
     return df
 
 
-def categorize_with_ai(df: pd.DataFrame, api_key: str) -> List[str]:
+def categorize_with_ai(df: pd.DataFrame, api_key: str, category_cache: Optional[Dict[str, str]] = None) -> List[str]:
     """
     Use Claude AI to categorize transactions in bulk.
+    Distinct descriptions are split into batches of AI_BATCH_SIZE which are
+    sent concurrently; anything the AI does not answer is categorized by rules.
+    Answers are stored in category_cache per normalized description, so
+    repeats are not re-sent while the caller keeps the same dict.
     
     Args:
         df: DataFrame with transactions
         api_key: Anthropic API key
+        category_cache: Optional {normalized description: category} dict, read and updated in place
         
     Returns:
         List of categories
     """
-    client = anthropic.Anthropic(api_key=api_key)
+    from anthropic_client import get_anthropic_client
+    
+    if category_cache is None:
+        category_cache = {}
+    
+    # One entry per distinct description; descriptions answered before skip the API
+    mapping = {}
+    transactions = []
+    for transaction in df.drop_duplicates('description')[['description', 'amount']].to_dict('records'):
+        cached = category_cache.get(_normalize_description(transaction['description']))
+        if cached is not None:
+            mapping[transaction['description']] = cached
+        else:
+            transactions.append(transaction)
+    batches = [transactions[i:i + AI_BATCH_SIZE] for i in range(0, len(transactions), AI_BATCH_SIZE)]
+    
+    if batches:
+        try:
+            batch_results = _categorize_batches(batches, get_anthropic_client(api_key))
+        except Exception as e:
+            print(f"AI categorization failed: {e}")
+            # Fallback to rule-based for everything not cached
+            batch_results = [{} for _ in batches]
+        
+        for batch, categories in zip(batches, batch_results):
+            for i, transaction in enumerate(batch, 1):
+                category = categories.get(i)
+                mapping[transaction['description']] = category
+                if category is not None:
+                    category_cache[_normalize_description(transaction['description'])] = category
     
-    # Create prompt with transaction list
-    transactions = df[['description', 'amount']].to_dict('records')
+    # Fill descriptions the AI skipped or answered with an unknown category
+    missing = [description for description, category in mapping.items() if category is None]
+    if missing:
+        mapping.update(zip(missing, categorize_descriptions(pd.Series(missing))))
     
-    prompt = f"""Categorize these financial transactions into appropriate categories.
+    return df['description'].map(mapping).tolist()
 
-Available categories:
-- Food & Groceries
-- Transportation
-- Entertainment
-- Shopping
-- Housing
-- Utilities
-- Dining Out
-- Healthcare
-- Income
-- Other
-
-Transactions:
-{format_transactions_for_prompt(transactions[:50])}  # Limit to 50 for prompt size
-
-Return ONLY a comma-separated list of categories in the same order as transactions.
-Example: Food & Groceries,Transportation,Entertainment,...
 
-Categories:"""
+def _normalize_description(description) -> str:
+    """Cache key for a description: case and surrounding whitespace do not change its category."""
+    return str(description).lower().strip()
+
 
-    try:
+def _categorize_batches(batches: List[List[Dict]], client) -> List[Dict[int, str]]:
+    """
+    Categorize all batches concurrently (at most AI_MAX_CONCURRENCY requests in flight).
+    Returns one {transaction number: category} dict per batch; a failed batch yields {}.
+    """
+    from anthropic_client import PROMPT_CACHING_BETA
+    
+    def categorize_batch(batch: List[Dict]) -> Dict[int, str]:
         response = client.messages.create(
             model="claude-sonnet-4-20250514",
-            max_tokens=1024,
+            max_tokens=2048,
             temperature=0.3,
-            messages=[{"role": "user", "content": prompt}]
+            system=[{"type": "text", "text": CATEGORIZATION_PROMPT, "cache_control": {"type": "ephemeral"}}],
+            messages=[{"role": "user", "content": build_categorization_prompt(batch)}],
+            extra_headers={"anthropic-beta": PROMPT_CACHING_BETA}
         )
-        
-        categories_text = response.content[0].text.strip()
-        categories = [cat.strip() for cat in categories_text.split(',')]
-        
-        # If we got fewer categories than transactions, fill with rule-based
-        if len(categories) < len(df):
-            remaining = df.iloc[len(categories):]['description'].apply(categorize_transaction_simple).tolist()
-            categories.extend(remaining)
-        
-        return categories[:len(df)]
-        
-    except Exception as e:
-        print(f"AI categorization failed: {e}")
-        # Fallback to rule-based
-        return df['description'].apply(categorize_transaction_simple).tolist()
+        return parse_categories_response(response.content[0].text)
+    
+    categorized = []
+    with ThreadPoolExecutor(max_workers=AI_MAX_CONCURRENCY) as executor:
+        futures = [executor.submit(categorize_batch, batch) for batch in batches]
+        for future in futures:
+            try:
+                categorized.append(future.result())
+            except Exception as e:
+                print(f"AI categorization batch failed: {e}")
+                categorized.append({})
+    
+    return categorized
+
+
+def build_categorization_prompt(transactions: List[Dict]) -> str:
+    """Build the per-batch part of the categorization prompt (the transaction list)."""
+    return f"""Transactions:
+{format_transactions_for_prompt(transactions)}
+
+Categories:"""
+
+
+def parse_categories_response(response_text: str) -> Dict[int, str]:
+    """Parse numbered category lines, keeping only known categories."""
+    return {
+        int(number): category
+        for number, category in _CATEGORY_LINE_RE.findall(response_text)
+        if category in DEFAULT_CATEGORIES
+    }
 
 
 def format_transactions_for_prompt(transactions: List[Dict]) -> str:
@@ -142,11 +261,28 @@ def get_category_summary(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         DataFrame with category summaries
     """
-    summary = df.groupby('category').agg({
-        'abs_amount': ['sum', 'mean', 'count']
-    }).round(2)
+    # Aggregate directly on the integer category codes
+    categories = df['category'].astype('category')
+    codes = categories.cat.codes.to_numpy()
+    values = df['abs_amount'].to_numpy(dtype=float)
+    
+    valid = codes >= 0
+    num_categories = len(categories.cat.categories)
+    totals = np.bincount(codes[valid], weights=values[valid], minlength=num_categories)
+    counts = np.bincount(codes[valid], minlength=num_categories)
+    
+    observed = counts > 0
+    summary = pd.DataFrame(
+        {
+            'Total': totals[observed],
+            'Average': totals[observed] / counts[observed],
+            'Count': counts[observed]
+        },
+        index=pd.CategoricalIndex(
+            categories.cat.categories[observed], categories=categories.cat.categories, name='category'
+        )
+    ).round(2)
     
-    summary.columns = ['Total', 'Average', 'Count']
     summary = summary.sort_values('Total', ascending=False)
     
     return summary
@@ -162,33 +298,33 @@ def get_budget_status(df: pd.DataFrame, budgets: dict) -> pd.DataFrame:
     Returns:
         DataFrame with budget comparison
     """
-    # Get actual spending by category (expenses only)
-    expense_df = df[df['type'] == 'Expense'].copy()
-    actual = expense_df.groupby('category')['abs_amount'].sum()
+    # Get actual spending by category (expenses only), aligned with the budgets
+    expense_df = df[(df['type'] == 'Expense').to_numpy()]
+    categories = list(budgets.keys())
+    budget = np.array(list(budgets.values()))
+    spent = _category_totals(expense_df).reindex(categories, fill_value=0).to_numpy(dtype=float)
     
     # Create comparison DataFrame
-    budget_data = []
-    for category, budget in budgets.items():
-        spent = actual.get(category, 0)
-        remaining = budget - spent
-        percent_used = (spent / budget * 100) if budget > 0 else 0
-        status = 'Over Budget' if spent > budget else 'Within Budget'
-        
-        budget_data.append({
-            'Category': category,
-            'Budget': budget,
-            'Spent': spent,
-            'Remaining': remaining,
-            'Percent Used': percent_used,
-            'Status': status
-        })
-    
-    budget_df = pd.DataFrame(budget_data)
+    percent_used = np.divide(spent, budget, out=np.zeros(len(spent)), where=budget > 0) * 100
+    
+    budget_df = pd.DataFrame({
+        'Category': categories,
+        'Budget': budget,
+        'Spent': spent,
+        'Remaining': budget - spent,
+        'Percent Used': percent_used,
+        'Status': np.where(spent > budget, 'Over Budget', 'Within Budget')
+    })
     budget_df = budget_df.sort_values('Percent Used', ascending=False)
     
     return budget_df
 
 
+def _category_totals(expense_df: pd.DataFrame) -> pd.Series:
+    """Total spending per observed category, in order of first appearance."""
+    return expense_df.groupby('category', observed=True, sort=False)['abs_amount'].sum()
+
+
 def suggest_budgets(df: pd.DataFrame, multiplier: float = 1.2) -> dict:
     """
     Suggest budgets based on historical spending.
@@ -200,14 +336,19 @@ def suggest_budgets(df: pd.DataFrame, multiplier: float = 1.2) -> dict:
     Returns:
         Dictionary of suggested budgets
     """
-    expense_df = df[df['type'] == 'Expense'].copy()
+    expense_df = df[(df['type'] == 'Expense').to_numpy()]
     
-    # Calculate number of months in data
-    date_range_days = (expense_df['date'].max() - expense_df['date'].min()).days
+    # Calculate number of months in data; process_transactions sorts newest first,
+    # so the range is usually just the two end points
+    dates = expense_df['date']
+    if len(dates) and dates.is_monotonic_decreasing:
+        date_range_days = (dates.iloc[0] - dates.iloc[-1]).days
+    else:
+        date_range_days = (dates.max() - dates.min()).days
     num_months = max(1, date_range_days / 30.44)
     
     # Calculate total spending per category
-    total_spending = expense_df.groupby('category')['abs_amount'].sum()
+    total_spending = _category_totals(expense_df).sort_index()
     
     # Calculate monthly average
     monthly_avg = total_spending / num_months
@@ -5,10 +5,60 @@ Copyright (c) 2025 Mattias Nyqvist
 Licensed under the MIT License
 """
 
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from typing import Optional, Tuple
 
+# Transaction types, stored as a categorical column
+TRANSACTION_TYPES = ['Income', 'Expense']
+
+# Calendar names for the month_name and day_of_week categoricals
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# When pyarrow is available, CSVs are parsed with its multithreaded reader and
+# descriptions are kept as Arrow strings (contiguous UTF-8) so .str methods run as Arrow kernels
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+    DESCRIPTION_DTYPE = 'string[pyarrow]'
+except ImportError:
+    CSV_ENGINE = 'c'
+    DESCRIPTION_DTYPE = object
+
+# calamine (Rust) parses workbooks much faster than openpyxl and also reads legacy .xls
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = None
+
+# Bytes read up front to detect the CSV format
+CSV_SNIFF_BYTES = 4096
+
+
+def detect_csv_format(sample: bytes) -> Tuple[str, str]:
+    """
+    Detect the separator and decimal mark of a CSV file from its first bytes.
+    Swedish exports separate columns with semicolons (comma decimals), so the
+    header line tells the formats apart.
+    
+    Args:
+        sample: First bytes of the file
+        
+    Returns:
+        Tuple of (separator, decimal)
+    """
+    header = sample.decode('utf-8', errors='ignore').split('\n', 1)[0]
+    
+    if header.count(';') > header.count(','):
+        return ';', ','
+    
+    return ',', '.'
+
+
 def load_transaction_file(file) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
     """
     Load transaction data from uploaded CSV or Excel file.
@@ -23,24 +73,18 @@ def load_transaction_file(file) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
     try:
         # Determine file type
         if file.name.endswith('.csv'):
-            # Try Swedish format first (semicolon separator, comma decimal)
+            # Pick Swedish or international format from the header, then parse once
+            sep, decimal = detect_csv_format(file.read(CSV_SNIFF_BYTES))
+            file.seek(0)  # Reset file pointer
             try:
-                df = pd.read_csv(file, sep=';', decimal=',', encoding='utf-8')
-                # Check if we got valid data
-                if df.shape[1] < 2:
-                    raise ValueError("Too few columns")
+                df = pd.read_csv(file, sep=sep, decimal=decimal, encoding='utf-8', engine=CSV_ENGINE)
             except:
-                # Try international format (comma separator, period decimal)
-                file.seek(0)  # Reset file pointer
-                try:
-                    df = pd.read_csv(file, sep=',', decimal='.', encoding='utf-8')
-                except:
-                    # Last attempt: let pandas auto-detect
-                    file.seek(0)
-                    df = pd.read_csv(file)
+                # Last attempt: let pandas auto-detect
+                file.seek(0)
+                df = pd.read_csv(file)
         
         elif file.name.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file)
+            df = pd.read_excel(file, engine=EXCEL_ENGINE)
         else:
             return None, "Unsupported file format. Please upload CSV or Excel file."
         
@@ -91,22 +135,28 @@ def process_transactions(df: pd.DataFrame) -> pd.DataFrame:
     # Ensure amount is numeric
     df['amount'] = pd.to_numeric(df['amount'], errors='coerce')
     
+    # Remove rows with missing critical data
+    df = df.dropna(subset=['date', 'amount', 'description'])
+    df['description'] = df['description'].astype(DESCRIPTION_DTYPE)
+    
     # Add derived columns
-    df['year'] = df['date'].dt.year
-    df['month'] = df['date'].dt.month
-    df['month_name'] = df['date'].dt.strftime('%B')
-    df['day_of_week'] = df['date'].dt.day_name()
+    # Date parts straight from the datetime64 buffer (epoch 1970-01-01 was a Thursday)
+    dates = df['date'].to_numpy()
+    months = dates.astype('datetime64[M]').astype(np.int64)
+    days = dates.astype('datetime64[D]').astype(np.int64)
+    df['year'] = (months // 12 + 1970).astype('int16')
+    df['month'] = (months % 12 + 1).astype('int16')
+    df['month_name'] = pd.Categorical.from_codes(months % 12, categories=MONTH_NAMES)
+    df['day_of_week'] = pd.Categorical.from_codes((days + 3) % 7, categories=DAY_NAMES)
     
     # Add transaction type (income vs expense)
-    df['type'] = df['amount'].apply(lambda x: 'Income' if x > 0 else 'Expense')
+    is_expense = ~(df['amount'].to_numpy() > 0)
+    df['type'] = pd.Categorical.from_codes(is_expense.astype(np.int8), categories=TRANSACTION_TYPES)
     df['abs_amount'] = df['amount'].abs()
     
     # Sort by date
     df = df.sort_values('date', ascending=False)
     
-    # Remove rows with missing critical data
-    df = df.dropna(subset=['date', 'amount', 'description'])
-    
     return df
 
 
@@ -135,12 +185,15 @@ def calculate_summary_stats(df: pd.DataFrame) -> dict:
     Returns:
         Dictionary with summary metrics
     """
-    total_income = df[df['amount'] > 0]['amount'].sum()
-    total_expenses = df[df['amount'] < 0]['amount'].abs().sum()
+    # One pass over the raw amounts, split by sign without filtered copies
+    amounts = df['amount'].to_numpy(dtype=float)
+    total_income = amounts.sum(where=amounts > 0)
+    total_expenses = np.abs(amounts.sum(where=amounts < 0))
     net_savings = total_income - total_expenses
     
-    avg_transaction = df['abs_amount'].mean()
     num_transactions = len(df)
+    # Every transaction is either income or expense, so the absolute amounts sum to both totals
+    avg_transaction = (total_income + total_expenses) / num_transactions if num_transactions else np.nan
     
     return {
         'total_income': total_income,
@@ -163,19 +216,14 @@ def load_csv_file(filepath: str) -> Tuple[Optional[pd.DataFrame], Optional[str]]
         Tuple of (DataFrame, error_message)
     """
     try:
-        # Try Swedish format first (semicolon separator, comma decimal)
+        # Pick Swedish or international format from the header, then parse once
+        with open(filepath, 'rb') as f:
+            sep, decimal = detect_csv_format(f.read(CSV_SNIFF_BYTES))
         try:
-            df = pd.read_csv(filepath, sep=';', decimal=',', encoding='utf-8')
-            # Check if we got valid data
-            if df.shape[1] < 2:
-                raise ValueError("Too few columns")
+            df = pd.read_csv(filepath, sep=sep, decimal=decimal, encoding='utf-8', engine=CSV_ENGINE)
         except:
-            # Try international format (comma separator, period decimal)
-            try:
-                df = pd.read_csv(filepath, sep=',', decimal='.', encoding='utf-8')
-            except:
-                # Last attempt: let pandas auto-detect
-                df = pd.read_csv(filepath)
+            # Last attempt: let pandas auto-detect
+            df = pd.read_csv(filepath)
         
         # Normalize column names (handle both Swedish and English)
         column_mapping = {
@@ -5,6 +5,7 @@ Copyright (c) 2025 Mattias Nyqvist
 Licensed under the MIT License
 """
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 from datetime import timedelta
@@ -33,9 +34,31 @@ def format_kr_local(number, decimals=0):
             return f"{number:,.{decimals}f}"
 
 
+# Thousands and decimal separators for Swedish formatting
+SWEDISH_SEPARATORS = str.maketrans({',': ' ', '.': ','})
+
+
+def format_kr_local_series(values: pd.Series, decimals=0) -> pd.Series:
+    """
+    Format a whole Series of numbers like format_kr_local.
+    The number format preference and format spec are resolved once for all values.
+    """
+    num_format = st.session_state.get('number_format', 'swedish') if hasattr(st, 'session_state') else 'swedish'
+    spec = f",.{decimals}f"
+    
+    if num_format == 'swedish':
+        formatted = [format(value, spec).translate(SWEDISH_SEPARATORS) for value in values.to_numpy()]
+    else:
+        formatted = [format(value, spec) for value in values.to_numpy()]
+    
+    return pd.Series(formatted, index=values.index)
+
+
 def detect_recurring_payments(df: pd.DataFrame, min_occurrences: int = 3) -> pd.DataFrame:
     """
     Detect recurring payments in transaction data.
+    Transactions are sorted by (description, date) once and every description's
+    statistics are computed over its contiguous segment with NumPy reductions.
     
     Args:
         df: DataFrame with transactions
@@ -45,65 +68,73 @@ def detect_recurring_payments(df: pd.DataFrame, min_occurrences: int = 3) -> pd.
         DataFrame with recurring payments
     """
     # Filter to expenses only
-    expense_df = df[df['type'] == 'Expense'].copy()
+    expense_df = df[(df['type'] == 'Expense').to_numpy()]
     
-    # Group by description and amount (similar amounts)
-    recurring = []
+    if expense_df.empty:
+        return pd.DataFrame()
     
-    # Group by description
-    for description in expense_df['description'].unique():
-        desc_transactions = expense_df[expense_df['description'] == description].sort_values('date')
-        
-        if len(desc_transactions) < min_occurrences:
-            continue
-        
-        # Check if amounts are similar (within 5% variance)
-        amounts = desc_transactions['abs_amount'].values
-        avg_amount = amounts.mean()
-        variance = amounts.std() / avg_amount if avg_amount > 0 else 0
-        
-        if variance > 0.05:  # More than 5% variance, probably not recurring
-            continue
-        
-        # Calculate intervals between transactions
-        dates = desc_transactions['date'].values
-        intervals = []
-        for i in range(1, len(dates)):
-            interval_days = (pd.Timestamp(dates[i]) - pd.Timestamp(dates[i-1])).days
-            intervals.append(interval_days)
-        
-        if not intervals:
-            continue
-        
-        avg_interval = sum(intervals) / len(intervals)
-        
-        # Determine frequency
-        if 25 <= avg_interval <= 35:
-            frequency = "Monthly"
-        elif 85 <= avg_interval <= 95:
-            frequency = "Quarterly"
-        elif 355 <= avg_interval <= 375:
-            frequency = "Yearly"
-        elif 6 <= avg_interval <= 8:
-            frequency = "Weekly"
-        else:
-            frequency = f"Every {int(avg_interval)} days"
-        
-        recurring.append({
-            'description': description,
-            'amount': avg_amount,
-            'frequency': frequency,
-            'occurrences': len(desc_transactions),
-            'first_date': desc_transactions['date'].min(),
-            'last_date': desc_transactions['date'].max(),
-            'category': desc_transactions['category'].iloc[0] if 'category' in desc_transactions.columns else 'Unknown',
-            'avg_interval_days': avg_interval
-        })
-    
-    if not recurring:
+    # Lay out each description's transactions contiguously, in date order
+    codes, descriptions = pd.factorize(expense_df['description'])
+    dates = expense_df['date'].to_numpy()
+    order = np.lexsort((dates, codes))
+    codes = codes[order]
+    dates = dates[order]
+    amounts = expense_df['abs_amount'].to_numpy(dtype=float)[order]
+    
+    # One segment per description
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    counts = np.diff(np.r_[starts, len(codes)])
+    group_codes = codes[starts]
+    
+    # Check if amounts are similar (within 5% variance)
+    avg_amounts = np.add.reduceat(amounts, starts) / counts
+    deviations = amounts - np.repeat(avg_amounts, counts)
+    stds = np.sqrt(np.add.reduceat(deviations ** 2, starts) / counts)
+    variances = np.divide(stds, avg_amounts, out=np.zeros_like(stds), where=avg_amounts > 0)
+    
+    # Whole days between consecutive transactions of the same description
+    intervals = np.zeros(len(dates), dtype=np.int64)
+    intervals[1:] = np.diff(dates) // np.timedelta64(1, 'D')
+    intervals[starts] = 0
+    avg_intervals = np.add.reduceat(intervals, starts) / np.maximum(counts - 1, 1)
+    
+    keep = (group_codes >= 0) & (counts >= max(min_occurrences, 2)) & (variances <= 0.05)
+    
+    if not keep.any():
         return pd.DataFrame()
     
-    recurring_df = pd.DataFrame(recurring)
+    starts = starts[keep]
+    counts = counts[keep]
+    avg_intervals = avg_intervals[keep]
+    
+    # Determine frequency
+    labels = np.select(
+        [
+            (avg_intervals >= 25) & (avg_intervals <= 35),
+            (avg_intervals >= 85) & (avg_intervals <= 95),
+            (avg_intervals >= 355) & (avg_intervals <= 375),
+            (avg_intervals >= 6) & (avg_intervals <= 8)
+        ],
+        ['Monthly', 'Quarterly', 'Yearly', 'Weekly'],
+        default=''
+    )
+    frequencies = [label or f"Every {int(interval)} days" for label, interval in zip(labels, avg_intervals)]
+    
+    if 'category' in expense_df.columns:
+        categories = expense_df['category'].to_numpy()[order][starts]
+    else:
+        categories = 'Unknown'
+    
+    recurring_df = pd.DataFrame({
+        'description': descriptions.take(group_codes[keep]).to_numpy(dtype=object),
+        'amount': avg_amounts[keep],
+        'frequency': frequencies,
+        'occurrences': counts,
+        'first_date': dates[starts],
+        'last_date': dates[starts + counts - 1],
+        'category': categories,
+        'avg_interval_days': avg_intervals
+    })
     recurring_df = recurring_df.sort_values('amount', ascending=False)
     
     return recurring_df
@@ -119,26 +150,23 @@ def calculate_recurring_totals(recurring_df: pd.DataFrame) -> Dict:
             'count': 0
         }
     
-    # Convert all to monthly equivalent
-    monthly_costs = []
-    
-    for _, row in recurring_df.iterrows():
-        freq = row['frequency']
-        amount = row['amount']
-        
-        if freq == "Monthly":
-            monthly_costs.append(amount)
-        elif freq == "Quarterly":
-            monthly_costs.append(amount / 3)
-        elif freq == "Yearly":
-            monthly_costs.append(amount / 12)
-        elif freq == "Weekly":
-            monthly_costs.append(amount * 4.33)
-        else:
-            # Use average interval
-            monthly_costs.append(amount * 30.44 / row['avg_interval_days'])
+    # Convert all to monthly equivalent, otherwise use the average interval
+    frequencies = recurring_df['frequency'].to_numpy()
+    amounts = recurring_df['amount'].to_numpy(dtype=float)
+    intervals = recurring_df['avg_interval_days'].to_numpy(dtype=float)
+    
+    monthly_costs = np.select(
+        [
+            frequencies == "Monthly",
+            frequencies == "Quarterly",
+            frequencies == "Yearly",
+            frequencies == "Weekly"
+        ],
+        [amounts, amounts / 3, amounts / 12, amounts * 4.33],
+        default=amounts * 30.44 / intervals
+    )
     
-    monthly_total = sum(monthly_costs)
+    monthly_total = float(monthly_costs.sum())
     yearly_total = monthly_total * 12
     
     return {
@@ -179,9 +207,9 @@ def render_recurring_payments_ui(recurring_df: pd.DataFrame):
     
     # Format for display
     display_df = recurring_df.copy()
-    display_df['amount'] = display_df['amount'].apply(lambda x: f"{format_kr_local(x)} kr")
-    display_df['first_date'] = pd.to_datetime(display_df['first_date']).dt.strftime('%Y-%m-%d')
-    display_df['last_date'] = pd.to_datetime(display_df['last_date']).dt.strftime('%Y-%m-%d')
+    display_df['amount'] = format_kr_local_series(display_df['amount']) + " kr"
+    display_df['first_date'] = display_df['first_date'].dt.strftime('%Y-%m-%d')
+    display_df['last_date'] = display_df['last_date'].dt.strftime('%Y-%m-%d')
     
     # Select columns for display
     display_columns = ['description', 'amount', 'frequency', 'category', 'occurrences', 'first_date', 'last_date']
@@ -209,4 +237,4 @@ def render_recurring_payments_ui(recurring_df: pd.DataFrame):
     )
     fig.update_layout(showlegend=False, yaxis={'categoryorder':'total ascending'})
     
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    st.plotly_chart(fig, use_container_width=True, key='recurring_by_category')
\ No newline at end of file